@@ -26,6 +26,9 @@ from __future__ import absolute_import
 import argparse  # pylint: disable=E0598
 import logging
 import json
+import shlex
+import threading
+import time
 
 # Import salt libs
 from salt.exceptions import SaltInvocationError, CommandExecutionError
@@ -36,9 +39,9 @@ from module_utils import ModuleBase as _ModuleBase  # pylint: disable=F0401
 from module_utils import Status  # pylint: disable=F0401
 from nulltype import Null
 
-import qubesadmin
-import qubesadmin.device_protocol
-import qubesadmin.firewall
+# qubesadmin is imported within the functions using it so that loading this
+# module (done by the salt loader on every minion start) stays cheap; the
+# application object itself is created once on first use by `_app`
 
 # Enable logging
 log = logging.getLogger(__name__)
@@ -51,6 +54,83 @@ def __virtual__():
     return __virtualname__
 
 
+# Qubes Admin API application shared by all qvm.* calls; see `_app`
+_APP = None
+
+# VM lookups by name as (VM object, expiry) pairs; see `_lookup_vm`
+_VM_CACHE = {}
+_VM_CACHE_TTL = 2.0
+
+# Serializes refreshing `_VM_CACHE`; state functions may call qvm.* functions
+# from several threads at once
+_VM_CACHE_LOCK = threading.Lock()
+
+
+def _app():
+    """
+    Return the shared `qubesadmin.Qubes` application.
+    """
+    global _APP  # pylint: disable=W0603
+    if _APP is None:
+        import qubesadmin  # pylint: disable=C0415
+        _APP = qubesadmin.Qubes()
+    return _APP
+
+
+def _lookup_vm(vmname):
+    """
+    Return the VM object named `vmname`, or None if it does not exist.
+
+    Every VM is cached from one listing of the collection; results are kept
+    for `_VM_CACHE_TTL` seconds, or until `_invalidate_vm` is called for the
+    VM.  Missing VMs are not cached; looking one up lists the collection
+    again so VMs created meanwhile are found.
+    """
+    now = time.monotonic()
+    hit = _VM_CACHE.get(vmname)
+    if hit and hit[1] > now:
+        return hit[0]
+
+    with _VM_CACHE_LOCK:
+        # Another thread may have refreshed the cache meanwhile
+        hit = _VM_CACHE.get(vmname)
+        if hit and hit[1] > now:
+            return hit[0]
+
+        # A single admin.vm.List call returns every VM; cache them all so
+        # lookups of other VMs during the same run don't query qubesd again
+        domains = _app().domains
+        domains.clear_cache()
+        expiry = now + _VM_CACHE_TTL
+        _VM_CACHE.clear()
+        for vm in domains:  # pylint: disable=C0103
+            _VM_CACHE[vm.name] = (vm, expiry)
+        hit = _VM_CACHE.get(vmname)
+        return hit[0] if hit else None
+
+
+def _invalidate_vm(vmname=None):
+    """
+    Drop the cached lookup of `vmname`; or of all VMs if not provided.
+    """
+    if vmname is None:
+        _VM_CACHE.clear()
+    else:
+        _VM_CACHE.pop(vmname, None)
+
+
+def _resolve_vm(namespace):
+    """
+    Return the VM object of `namespace`, looking it up from qvm.collection on
+    first access; None if the VM does not exist.
+    """
+    # pylint: disable=W0212
+    if getattr(namespace, '_vm', Null) is Null and \
+            getattr(namespace, '_vm_name', None):
+        namespace._vm = _lookup_vm(namespace._vm_name)
+    return getattr(namespace, '_vm', None) or None
+
+
 def _vm():
     """
     Get Qubes VM object from qvm.collection.
@@ -60,29 +140,65 @@ def _vm():
     @property
     def vm(self):  # pylint: disable=C0103
         """
-        Return VM object.
+        Return VM object; looked up from qvm.collection on first access.
         """
-        if not self._vm:  # pylint: disable=W0212
+        vm = _resolve_vm(self)  # pylint: disable=C0103,W0621
+        if vm is None:
             raise SaltInvocationError(
                 message='Virtual Machine does not exist!'
             )
-        return self._vm  # pylint: disable=W0212
+        return vm
 
     @vm.setter
     def vm(self, value):  # pylint: disable=C0103
         """
-        Get Qubes VM object from qvm.collection and set it here.
+        Record the VM name; the VM object is only looked up when used.
         """
         if value:
-            app = qubesadmin.Qubes()
-            try:
-                self._vm = app.domains[value]
-            except KeyError:
-                self._vm = None  # pylint: disable=W0212
+            self._vm_name = value  # pylint: disable=W0212
+            self._vm = Null  # pylint: disable=W0212
 
     return vm
 
 
+def _vm_exists(vmname):
+    """
+    Return True if a virtual machine named `vmname` exists.
+    """
+    return _lookup_vm(vmname) is not None
+
+
+def _add_vmname_argument(parser):
+    """
+    Add the 'vmname' positional shared by the qvm.* functions to `parser`.
+    """
+    parser.add_argument('vmname', action=_VMAction, help='Virtual machine name')
+
+
+def _add_store_true_flags(parser, flags):
+    """
+    Add `flags`, a sequence of (flag name, help) pairs, to `parser` as
+    'store_true' options.
+    """
+    for name, help_ in flags:
+        parser.add_argument('--' + name, action='store_true', help=help_)
+
+
+def _remove_duplicates(*lists):
+    """
+    Remove duplicate values across `lists` in place; keeping the first one
+    listed.
+    """
+    seen = set()
+    for values in lists:
+        unique = []
+        for value in values:
+            if value not in seen:
+                seen.add(value)
+                unique.append(value)
+        values[:] = unique
+
+
 # pylint: disable=R0903
 class _Namespace(argparse.Namespace):
     """
@@ -98,7 +214,8 @@ class _Namespace(argparse.Namespace):
 # pylint: disable=R0903
 class _VMAction(argparse.Action):
     """
-    Custom action to retrieve virtual machine settings object.
+    Custom action to record the virtual machine name; its settings object
+    is retrieved on first use of `namespace.vm`.
     """
 
     def __call__(self, parser, namespace, values, options_string=None):
@@ -111,6 +228,36 @@ class _VMAction(argparse.Action):
         setattr(namespace, self.dest, values)
 
 
+class _PowerStateCache(dict):
+    """
+    Power states read during one qvm.* call, keyed by VM name.
+
+    Entries are dropped with `invalidate` after any operation that may change
+    the power state of a VM.
+    """
+
+    __slots__ = ()
+
+    def read(self, vm):  # pylint: disable=C0103
+        """
+        Return the power state of `vm` as reported by qubesd.
+        """
+        try:
+            return self[vm.name]
+        except KeyError:
+            power_state = self[vm.name] = vm.get_power_state()
+            return power_state
+
+    def invalidate(self, vmname=None):
+        """
+        Forget the power state of `vmname`; or of all VMs if not provided.
+        """
+        if vmname is None:
+            self.clear()
+        else:
+            self.pop(vmname, None)
+
+
 # pylint: disable=R0903
 class _QVMBase(_ModuleBase):
     """
@@ -130,19 +277,114 @@ class _QVMBase(_ModuleBase):
 
         super(_QVMBase, self).__init__(__virtualname, *varargs, **kwargs)
         self.argparser.options['namespace'] = _Namespace()
+        self.power_states = _PowerStateCache()
 
 
-def is_halted(qvm, prefix=None, message=None, error_message=None):
+def _power_state(vm, cache):
     """
-    Check VM power state.
+    Return the lower-cased power state of `vm`; read through the
+    `_PowerStateCache` `cache`.
+    """
+    return cache.read(vm).strip().lower()
+
+
+def _power_status(vm, states, cache):
+    """
+    Return power state `Status` of `vm`; passes if the power state is one of
+    `states` or `states` contains 'status'.
+
+    Used by the `is_*` helpers so they do not need to construct and parse a
+    whole `qvm.state` call.
+    """
+    stdout = cache.read(vm)
+    power_state = stdout.strip().lower()
+
+    retcode = 0
+    if 'status' not in states:
+        if power_state not in states:
+            retcode = 1
+
+    return Status(
+        retcode=retcode,
+        data=power_state,
+        stdout=stdout,
+        stderr='',
+        message='qvm.state {0}'.format(' '.join(states))
+    )
+
+
+def _vm_call(qvm, cmd, method, *varargs, **kwargs):
+    """
+    Call VM `method` through the Qubes Admin API instead of spawning the
+    equivalent `cmd`; returns the saved `Status`.
+
+    In test mode `cmd` is handed to `qvm.run` so it is still reported, but
+    nothing is executed.
+    """
+    if __opts__['test']:
+        return qvm.run(cmd)
+
+    import qubesadmin.exc  # pylint: disable=C0415
+    try:
+        method(*varargs, **kwargs)
+    except qubesadmin.exc.QubesException as err:
+        status = Status(retcode=1, stdout='', stderr=str(err), message=cmd)
+    else:
+        status = Status(retcode=0, stdout='', stderr='', message=cmd)
+    finally:
+        qvm.power_states.invalidate()
+    return qvm.save_status(status)
+
+
+def _wait_for_shutdown(vm):  # pylint: disable=C0103
     """
+    Wait up to `vm.shutdown_timeout` seconds for `vm` to halt.
+
+    Waits on qubesd 'domain-shutdown' events like qvm-shutdown does; falls
+    back to polling the power state with a backed-off delay (starting at
+    50ms, at most 500ms) for the remaining time if events are unavailable or
+    the event stream fails.
+    """
+    deadline = time.monotonic() + vm.shutdown_timeout
     try:
-        halted_status = state(qvm.args.vm.name, *['halted'])
+        import asyncio  # pylint: disable=C0415
+        import qubesadmin.events.utils  # pylint: disable=C0415
+    except ImportError:
+        pass
+    else:
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(asyncio.wait_for(
+                qubesadmin.events.utils.wait_for_domain_shutdown([vm]),
+                vm.shutdown_timeout
+            ))
+            return
+        except asyncio.TimeoutError:
+            return
+        except Exception as err:  # pylint: disable=W0703
+            # Lost qubesd event socket, event loop already running, ...
+            log.debug('Waiting on shutdown events of %s failed: %s; polling',
+                      vm.name, err)
+        finally:
+            loop.close()
+
+    delay = 0.05
+    while vm.is_running() and time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 1.5, 0.5)
+
 
-    except SaltInvocationError as err:
+def is_halted(qvm, prefix=None, message=None, error_message=None):
+    """
+    Check VM power state.
+    """
+    vm = _resolve_vm(qvm.args)  # pylint: disable=C0103
+    if vm is None:
         halted_status = Status()
         prefix = '[SKIP] '
-        message = err.message
+        message = 'Virtual Machine does not exist!'
+    else:
+        halted_status = _power_status(vm, ['halted'], qvm.power_states)
 
     qvm.save_status(
         halted_status,
@@ -157,7 +399,9 @@ def is_running(qvm, prefix=None, message=None, error_message=None):
     """
     Check if VM is running.
     """
-    running_status = state(qvm.args.vm.name, *['running'])
+    running_status = _power_status(
+        qvm.args.vm, ['running'], qvm.power_states
+    )
 
     qvm.save_status(
         running_status,
@@ -173,7 +417,9 @@ def is_paused(qvm, prefix=None, message=None, error_message=None):
     """
     Check if VM is in a paused state.
     """
-    paused_status = state(qvm.args.vm.name, *['paused'])
+    paused_status = _power_status(
+        qvm.args.vm, ['paused'], qvm.power_states
+    )
 
     qvm.save_status(
         paused_status,
@@ -185,6 +431,35 @@ def is_paused(qvm, prefix=None, message=None, error_message=None):
     return paused_status
 
 
+# qvm.check 'check' positional choices
+_CHECK_CHOICES = ('exists', 'missing')
+
+# qvm.state 'state' positional choices
+_STATE_CHOICES = ('status', 'running', 'halted', 'transient', 'paused')
+
+
+def _check_status(vmname, check_='exists'):
+    """
+    Return `Status` of `vmname` existing (`check_` 'exists') or not
+    ('missing').
+
+    Used by `check` and the functions creating or removing VMs so they do not
+    need to construct and parse a whole nested `qvm.check` call.
+    """
+    exists = _vm_exists(vmname)
+    status = Status(
+        retcode=0 if exists else 1,
+        data=exists,
+        stdout='',
+        stderr='',
+        message='qvm.check {0}'.format(check_)
+    )
+
+    if check_.lower() == 'missing':
+        status.retcode = not status.retcode
+    return status
+
+
 def check(vmname, *varargs, **kwargs):
     """
     Check if a virtual machine exists::
@@ -214,37 +489,27 @@ def check(vmname, *varargs, **kwargs):
     qvm.argparser.options['hide'] = ['check']
 
     qvm.parser.add_argument('--quiet', action='store_true', help='Quiet')
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument(
         'check',
         nargs='?',
         default='exists',
-        choices=('exists', 'missing'),
+        choices=_CHECK_CHOICES,
         help='Check if virtual machine exists or not'
     )
     args = qvm.parse_args(vmname, *varargs, **kwargs)
 
-    # pylint: disable=W0613
-    def run_post(cmd, status, data):
-        """
-        Called by run to allow additional post-processing of status.
-        """
-        if args.check.lower() == 'missing':
-            status.retcode = not status.retcode
+    # Answer in-process rather than forking '/usr/bin/qvm-check'; runs in
+    # test mode as well since nothing is modified
+    status = _check_status(args.vmname, args.check)
 
-    # Execute command (will not execute in test mode)
-    cmd = '/usr/bin/qvm-check {0}'.format(' '.join(args._argv))  # pylint: disable=W0212
+    # Honour a caller supplied post-run hook as 'qvm.run' would
+    post_hook = kwargs.get('run-post-hook', None)
+    if post_hook:
+        post_hook(None, status, None)
 
-    # pylint: disable=W0612
-    status = qvm.run(
-        cmd,
-        post_hook=run_post,
-        test_ignore=True
-    )
+    # Merge status
+    qvm.save_status(status)
 
     # Returns the status 'data' dictionary
     return qvm.status()
@@ -271,45 +536,37 @@ def state(vmname, *varargs, **kwargs):
         - state:                (status)|running|halted|transient|paused
     """
     qvm = _QVMBase('qvm.state', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument(
         'state',
         nargs='*',
         default='status',
-        choices=('status', 'running', 'halted', 'transient', 'paused'),
+        choices=_STATE_CHOICES,
         help='Check power state of virtual machine'
     )
     args = qvm.parse_args(vmname, *varargs, **kwargs)
 
-    # Check VM power state
-    retcode = 0
-    stdout = args.vm.get_power_state()
-    power_state = stdout.strip().lower()
-
-    if 'status' not in args.state:
-        if power_state not in args.state:
-            retcode = 1
+    # 'state' is the default string 'status' unless states were listed
+    states = (args.state,) if isinstance(args.state, str) else tuple(args.state)
 
-    # Create status
-    status = Status(
-        retcode=retcode,
-        data=power_state,
-        stdout=stdout,
-        stderr='',
-        message='{0} {1}'.format(qvm.__virtualname__, ' '.join(args.state))
-    )
-
-    # Merge status
-    qvm.save_status(status)
+    # Check VM power state and merge status
+    qvm.save_status(_power_status(args.vm, states, qvm.power_states))
 
     # Returns the status 'data' dictionary
     return qvm.status()
 
 
+# qvm.create store_true flags
+_CREATE_FLAGS = (
+    ('quiet', 'Quiet'),
+    ('net', 'Create NetVM'),
+    ('proxy', 'Create ProxyVM'),
+    ('hvm', 'Create HVM (standalone unless --template option used)'),
+    ('hvm-template', 'Create HVM template'),
+    ('standalone', 'Create standalone VM - independent of template'),
+)
+
+
 def create(vmname, *varargs, **kwargs):
     """
     Create a new virtual machine::
@@ -346,32 +603,7 @@ def create(vmname, *varargs, **kwargs):
           - quiet
     """
     qvm = _QVMBase('qvm.create', **kwargs)
-    qvm.parser.add_argument('--quiet', action='store_true', help='Quiet')
-    qvm.parser.add_argument(
-        '--net',
-        action='store_true',
-        help='Create NetVM'
-    )
-    qvm.parser.add_argument(
-        '--proxy',
-        action='store_true',
-        help='Create ProxyVM'
-    )
-    qvm.parser.add_argument(
-        '--hvm',
-        action='store_true',
-        help='Create HVM (standalone unless --template option used)'
-    )
-    qvm.parser.add_argument(
-        '--hvm-template',
-        action='store_true',
-        help='Create HVM template'
-    )
-    qvm.parser.add_argument(
-        '--standalone',
-        action='store_true',
-        help='Create standalone VM - independent of template'
-    )
+    _add_store_true_flags(qvm.parser, _CREATE_FLAGS)
     qvm.parser.add_argument(
         '--template',
         nargs=1,
@@ -445,32 +677,35 @@ def create(vmname, *varargs, **kwargs):
     for name, value in properties.items():
         options.append('--property=' + name + '=' + value)
 
-    # pylint: disable=W0613
-    def missing_post_hook(cmd, status, data):
-        """
-        Post-run hook called after `check` for missing status.
-        """
-        if status.retcode:
-            status.result = status.retcode
-
     # Confirm VM is missing
-    missing_status = check(
-        args.vmname, *['missing'], **{
-            'run-post-hook': missing_post_hook
-        }
-    )
+    missing_status = _check_status(args.vmname, 'missing')
+    if missing_status.retcode:
+        missing_status.result = missing_status.retcode
     qvm.save_status(missing_status)
     if missing_status.failed():
         return qvm.status()
 
     # Execute command (will not execute in test mode)
-    cmd = '/usr/bin/qvm-create {} {}'.format(args.vmname, ' '.join(options))  # pylint: disable=W0212
+    cmd = shlex.join(['/usr/bin/qvm-create', args.vmname] + options)
     status = qvm.run(cmd)  # pylint: disable=W0612
+    _invalidate_vm(args.vmname)
 
     # Returns the status 'data' dictionary
     return qvm.status()
 
 
+# qvm.remove flags handled here rather than passed on to qvm-remove
+_REMOVE_LOCAL_ARGV = frozenset(('--verify',))
+
+# qvm.remove store_true flags
+_REMOVE_FLAGS = (
+    ('just-db', 'Remove only from the Qubes Xen DB, do not remove any files'),
+    ('quiet', 'Quiet'),
+    ('force-root', 'Force to run, even with root privileges'),
+    ('verify', 'Confirm VM is missing once removed'),
+)
+
+
 def remove(vmname, *varargs, **kwargs):
     """
     Remove an existing virtual machine::
@@ -493,27 +728,19 @@ def remove(vmname, *varargs, **kwargs):
           - just-db:
           - force-root
           - quiet
+          - verify              # confirm VM is missing after removal
     """
     # Hide 'shutdown' flag from argv as its not a valid qvm.remove option
     qvm = _QVMBase('qvm.remove', **kwargs)
-    qvm.parser.add_argument(
-        '--just-db',
-        action='store_true',
-        help='Remove only from the Qubes Xen DB, do not remove any files'
-    )
-    qvm.parser.add_argument('--quiet', action='store_true', help='Quiet')
-    qvm.parser.add_argument(
-        '--force-root',
-        action='store_true',
-        help='Force to run, even with root privileges'
-    )
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_store_true_flags(qvm.parser, _REMOVE_FLAGS)
+    _add_vmname_argument(qvm.parser)
     args = qvm.parse_args(vmname, *varargs, **kwargs)
 
+    # Remove 'verify' flag from argv as its not a valid qvm.remove option
+    args._argv[:] = [  # pylint: disable=W0212
+        arg for arg in args._argv if arg not in _REMOVE_LOCAL_ARGV  # pylint: disable=W0212
+    ]
+
     if not is_halted(qvm):
         # 'shutdown' VM ('force' mode will kill on failed shutdown)
         shutdown_status = qvm.save_status(
@@ -525,17 +752,31 @@ def remove(vmname, *varargs, **kwargs):
             return qvm.status()
 
     # Execute command (will not execute in test mode)
-    cmd = '/usr/bin/qvm-remove --force {0}'.format(' '.join(args._argv))  # pylint: disable=W0212
+    cmd = shlex.join(['/usr/bin/qvm-remove', '--force'] + args._argv)  # pylint: disable=W0212
     status = qvm.run(cmd)  # pylint: disable=W0612
+    _invalidate_vm(args.vmname)
 
-    # Confirm VM has been removed (don't fail in test mode)
-    if not __opts__['test']:
-        qvm.save_status(check(args.vmname, *['missing']))
+    # The qvm-remove exit code is authoritative; only confirm VM has been
+    # removed if requested (don't fail in test mode)
+    if args.verify and not __opts__['test']:
+        qvm.save_status(_check_status(args.vmname, 'missing'))
 
     # Returns the status 'data' dictionary and adds comments in 'test' mode
     return qvm.status()
 
 
+# qvm.clone flags handled here rather than passed on to qvm-clone
+_CLONE_LOCAL_ARGV = frozenset(('--shutdown', '--verify'))
+
+# qvm.clone store_true flags
+_CLONE_FLAGS = (
+    ('shutdown', 'Will shutdown a running or paused VM to allow cloning'),
+    ('quiet', 'Quiet'),
+    ('force-root', 'Force to run, even with root privileges'),
+    ('verify', 'Confirm clone VM exists once cloned'),
+)
+
+
 # pylint: disable=W0621
 def clone(vmname, clone, *varargs, **kwargs):
     """
@@ -563,19 +804,10 @@ def clone(vmname, clone, *varargs, **kwargs):
           - shutdown
           - force-root
           - quiet
+          - verify              # confirm clone exists once cloned
     """
     qvm = _QVMBase('qvm.clone', **kwargs)
-    qvm.parser.add_argument(
-        '--shutdown',
-        action='store_true',
-        help='Will shutdown a running or paused VM to allow cloning'
-    )
-    qvm.parser.add_argument('--quiet', action='store_true', help='Quiet')
-    qvm.parser.add_argument(
-        '--force-root',
-        action='store_true',
-        help='Force to run, even with root privileges'
-    )
+    _add_store_true_flags(qvm.parser, _CLONE_FLAGS)
     qvm.parser.add_argument(
         '--path',
         nargs=1,
@@ -589,12 +821,14 @@ def clone(vmname, clone, *varargs, **kwargs):
     qvm.parser.add_argument('clone', help='New clone VM name')
     args = qvm.parse_args(vmname, clone, *varargs, **kwargs)
 
-    # Remove 'shutdown' flag from argv as its not a valid qvm.clone option
-    if '--shutdown' in args._argv:  # pylint: disable=W0212
-        args._argv.remove('--shutdown')  # pylint: disable=W0212
+    # Remove 'shutdown' and 'verify' flags from argv as they are not valid
+    # qvm.clone options
+    args._argv[:] = [  # pylint: disable=W0212
+        arg for arg in args._argv if arg not in _CLONE_LOCAL_ARGV  # pylint: disable=W0212
+    ]
 
     # Check if 'clone' VM exists; fail if it does and return
-    clone_check_status = qvm.save_status(check(args.clone, *['missing']))
+    clone_check_status = qvm.save_status(_check_status(args.clone, 'missing'))
     if clone_check_status.failed():
         return qvm.status()
 
@@ -610,21 +844,127 @@ def clone(vmname, clone, *varargs, **kwargs):
                 return qvm.status()
 
     # Execute command (will not execute in test mode)
-    cmd = '/usr/bin/qvm-clone {0}'.format(' '.join(args._argv))  # pylint: disable=W0212
+    cmd = shlex.join(['/usr/bin/qvm-clone'] + args._argv)  # pylint: disable=W0212
     status = qvm.run(cmd)  # pylint: disable=W0612
+    _invalidate_vm(args.clone)
 
     if __opts__['test']:
         message = 'VM is set to be cloned'
         status = qvm.save_status(message=message)
         return qvm.status()
 
-    # Confirm VM has been cloned
-    qvm.save_status(check(args.clone, *['exists']))
+    # The qvm-clone exit code is authoritative; only confirm VM has been
+    # cloned if requested
+    if args.verify:
+        qvm.save_status(_check_status(args.clone, 'exists'))
 
     # Returns the status 'data' dictionary
     return qvm.status()
 
 
+def _add_arguments(parser, arguments):
+    """
+    Add `arguments`, a sequence of (option strings, keywords) pairs, to
+    `parser`.
+    """
+    for flags, options in arguments:
+        # argparse hands the default object itself to the namespace; don't
+        # share a mutable default between calls
+        if isinstance(options.get('default', None), list):
+            options = dict(options, default=list(options['default']))
+        parser.add_argument(*flags, **options)
+
+
+# qvm.prefs 'action' positional choices
+_PREFS_ACTIONS = ('list', 'get', 'gry', 'set')
+
+# qvm.prefs 'properties' argument group
+_PREFS_PROPERTIES = (
+    (('--autostart',), dict(nargs=1, type=bool, default=False)),
+    (('--debug',), dict(nargs=1, type=bool, default=False)),
+    (('--default-user', '--default_user'), dict(nargs=1)),
+    (('--default-dispvm', '--default_dispvm'), dict(nargs=1)),
+    (('--management-dispvm', '--management_dispvm'), dict(nargs=1)),
+    (('--guivm',), dict(nargs=1)),
+    (('--audiovm',), dict(nargs=1)),
+    (
+        ('--template-for-dispvms', '--template_for_dispvms', '--dispvm-allowed'),
+        dict(nargs=1, type=bool)
+    ),
+    (('--virt-mode', '--virt_mode'), dict(nargs=1)),
+    (
+        ('--label',),
+        dict(
+            nargs=1,
+            choices=(
+                'red', 'yellow', 'green', 'blue', 'purple', 'orange', 'gray',
+                'black'
+            )
+        )
+    ),
+    (('--last-backup', '--last_backup'), dict(nargs=1)),
+    (('--include-in-backups', '--include_in_backups'), dict(nargs=1, type=bool)),
+    (('--installed-by-rpm', '--installed_by_rpm'), dict(nargs=1, type=bool)),
+    (('--ip',), dict(nargs=1)),
+    (('--kernel',), dict(nargs=1)),
+    (('--kernelopts',), dict(nargs=1)),
+    (('--mac',), dict(nargs=1)),
+    (('--maxmem',), dict(nargs=1, type=int)),
+    (('--memory',), dict(nargs=1, type=int)),
+    (('--netvm',), dict(nargs=1)),
+    (
+        ('--pci-strictreset', '--pci_strictreset'),
+        dict(nargs=1, type=bool, default=True)
+    ),
+    (('--pcidevs',), dict(nargs='*', default=[])),
+    (('--provides-network',), dict(nargs=1, type=bool, default=False)),
+    (('--template',), dict(nargs=1)),
+    (
+        ('--qrexec-timeout', '--qrexec_timeout'),
+        dict(nargs=1, type=int, default=60)
+    ),
+    (('--updateable',), dict(nargs=1, type=bool)),
+    (('--vcpus',), dict(nargs=1, type=int)),
+)
+
+# Maps property keys to vm attributes
+_PREFS_PROPERTY_MAP = {
+    'last_backup': 'backup_timestamp',
+    'dispvm_allowed': 'template_for_dispvms',
+}
+
+# Property status line; name padded to a 19 character column
+_PREFS_FMT = '{0:<19}: {1}'
+
+# Property names as listed, and every keyword accepted for a property (both
+# hyphen and underscore spellings)
+_PREFS_NAMES = tuple(flags[0][2:] for flags, _ in _PREFS_PROPERTIES)
+_PREFS_KEYS = tuple(dict.fromkeys(
+    key
+    for flags, _ in _PREFS_PROPERTIES
+    for flag in flags
+    for key in (flag[2:], flag[2:].replace('-', '_'))
+))
+
+# Maps every property keyword to its vm attribute; Qubes keys are stored with
+# underscrores ('_'), not hyphens ('-')
+_PREFS_DESTS = {
+    key: _PREFS_PROPERTY_MAP.get(key.replace('-', '_'), key.replace('-', '_'))
+    for key in _PREFS_KEYS
+}
+
+
+def _read_property(vm, name):  # pylint: disable=C0103
+    """
+    Return the current value of property `name` of `vm` as listed by
+    qvm.prefs.
+    """
+    if vm.property_is_default(name):
+        return '*default*'
+    value = getattr(vm, name, Null)
+    return getattr(value, 'name', value)
+
+
 def prefs(vmname, *varargs, **kwargs):
     """
     Set preferences for a virtual machine domain::
@@ -714,33 +1054,23 @@ def prefs(vmname, *varargs, **kwargs):
             - memory: 400
             - maxmem: 4000
     """
+    # pylint: disable=C0415
+    import qubesadmin.device_protocol
+    import qubesadmin.exc
+
     # Also allow CLI qubesctl qvm.prefs <vm_name> memory maxmem
     if varargs:
-        properties = []
-        for property_ in varargs:
-            properties.append(property_)
-        if properties:
-            kwargs['get'] = properties
+        kwargs['get'] = list(varargs)
 
     # Also allow 'get' instead of 'action=get'
     if 'get' in kwargs:
-        # pylint: disable=E0598
-        kwargs.update(
-            {
-                k: Null
-                for k in kwargs.pop('get')
-            }
-        )  # pylint: disable=E0598
+        kwargs.update(dict.fromkeys(kwargs.pop('get'), Null))
         kwargs['action'] = 'get'
 
     # Also allow 'set' instead of 'action=set'
     elif 'set' in kwargs:
-        kwargs.update(
-            {
-                k: v
-                for d in kwargs.pop('set') for k, v in d.items()
-            }
-        )  # pylint: disable=E0598
+        for properties in kwargs.pop('set'):
+            kwargs.update(properties)
         kwargs['action'] = 'set'
 
     # Set default status-mode to show all status entries
@@ -749,98 +1079,24 @@ def prefs(vmname, *varargs, **kwargs):
     # Hide 'action' flag from argv as its not a valid qvm.pref option
     qvm = _QVMBase('qvm.create', **kwargs)
     qvm.argparser.options['hide'] = ['action']
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument(
         'action',
         nargs='?',
         default='list',
-        choices=('list', 'get', 'gry', 'set')
+        choices=_PREFS_ACTIONS
     )
 
     qvm.argparser.add_argument_group('properties')
     properties = qvm.argparser.get_argument_group('properties')
-    properties.add_argument('--autostart', nargs=1, type=bool, default=False)
-    properties.add_argument('--debug', nargs=1, type=bool, default=False)
-    properties.add_argument('--default-user', '--default_user', nargs=1)
-    properties.add_argument('--default-dispvm', '--default_dispvm', nargs=1)
-    properties.add_argument('--management-dispvm', '--management_dispvm', nargs=1)
-    properties.add_argument('--guivm', nargs=1)
-    properties.add_argument('--audiovm', nargs=1)
-    properties.add_argument(
-        '--template-for-dispvms',
-        '--template_for_dispvms',
-        '--dispvm-allowed',
-        nargs=1, type=bool)
-    properties.add_argument('--virt-mode', '--virt_mode', nargs=1)
-    properties.add_argument(
-        '--label',
-        nargs=1,
-        choices=(
-            'red', 'yellow', 'green', 'blue', 'purple', 'orange', 'gray',
-            'black'
-        )
-    )
-    properties.add_argument('--last-backup', '--last_backup', nargs=1)
-    properties.add_argument(
-        '--include-in-backups',
-        '--include_in_backups',
-        nargs=1,
-        type=bool
-    )
-    properties.add_argument(
-        '--installed-by-rpm',
-        '--installed_by_rpm',
-        nargs=1,
-        type=bool
-    )
-    properties.add_argument('--ip', nargs=1)
-    properties.add_argument('--kernel', nargs=1)
-    properties.add_argument('--kernelopts', nargs=1)
-    properties.add_argument('--mac', nargs=1)
-    properties.add_argument('--maxmem', nargs=1, type=int)
-    properties.add_argument('--memory', nargs=1, type=int)
-    properties.add_argument('--netvm', nargs=1)
-    properties.add_argument(
-        '--pci-strictreset',
-        '--pci_strictreset',
-        nargs=1,
-        type=bool,
-        default=True
-    )
-    properties.add_argument('--pcidevs', nargs='*', default=[])
-    properties.add_argument('--provides-network', nargs=1, type=bool,
-                            default=False)
-    properties.add_argument('--template', nargs=1)
-    properties.add_argument(
-        '--qrexec-timeout',
-        '--qrexec_timeout',
-        nargs=1,
-        type=int,
-        default=60
-    )
-    properties.add_argument('--updateable', nargs=1, type=bool)
-    properties.add_argument('--vcpus', nargs=1, type=int)
-
-    # Maps property keys to vm attributes
-    property_map = {
-        'last_backup': 'backup_timestamp',
-        'dispvm_allowed': 'template_for_dispvms',
-    }
+    _add_arguments(properties, _PREFS_PROPERTIES)
 
     # pylint: disable=W0613
 
     args = qvm.parse_args(vmname, *varargs, **kwargs)
-    label_width = 19
-    fmt = "{{0:<{0}}}: {{1}}".format(label_width)
 
-    all_properties = qvm.argparser.get_argument_group_keys('properties')
-    selected_properties = qvm.argparser.get_argument_group_keys(
-        'properties', kwargs
-    )
+    all_properties = _PREFS_NAMES
+    selected_properties = [key for key in _PREFS_KEYS if key in kwargs]
 
     # Default action is list, but allow no action for set
     if args.action in ['list']:
@@ -853,7 +1109,7 @@ def prefs(vmname, *varargs, **kwargs):
         result = set(varargs).difference(set(selected_properties))
         if result:
             for r in result:
-                message = fmt.format(r, 'Invalid key!')
+                message = _PREFS_FMT.format(r, 'Invalid key!')
                 status = Status(retcode=1)
                 qvm.save_status(status, message=message)
 
@@ -861,28 +1117,34 @@ def prefs(vmname, *varargs, **kwargs):
     pci_strictreset = kwargs.get('pci_strictreset', None)
     current_pci_strictreset = None
 
+    # Assigned PCI devices; fetched once from qubesd, shared by 'pcidevs' and
+    # 'pci_strictreset' and kept current as devices are (un)assigned below
+    pci_assigned = None
+
+    vm = args.vm  # pylint: disable=C0103
+
     changed = False
     for key in selected_properties:
 
-        # Qubes keys are stored with underscrores ('_'), not hyphens ('-')
-        dest = key.replace('-', '_')
-        dest = property_map.get(dest, dest)
+        dest = _PREFS_DESTS[key]
+
+        if dest in ('pcidevs', 'pci_strictreset') and pci_assigned is None:
+            pci_assigned = list(
+                vm.devices['pci'].get_assigned_devices(required_only=True))
 
         if dest == 'pcidevs':
             value_current = [str(dev.port_id).replace('_', ':') for dev
-                             in args.vm.devices['pci'].get_assigned_devices(required_only=True)]
+                             in pci_assigned]
         elif dest == 'pci_strictreset':
             value_current = all(not assignment.options.get('no-strict-reset', False)
-                                for assignment in args.vm.devices['pci'].get_assigned_devices(required_only=True))
+                                for assignment in pci_assigned)
             current_pci_strictreset = value_current
-        elif args.vm.property_is_default(dest):
-            value_current = '*default*'
         else:
-            value_current = getattr(args.vm, dest, Null)
-            value_current = getattr(value_current, 'name', value_current)
+            value_current = _read_property(vm, dest)
 
         if args.action in ['list', 'get', 'gry']:
-            qvm.save_status(prefix='', message=fmt.format(dest, value_current))
+            qvm.save_status(prefix='',
+                            message=_PREFS_FMT.format(dest, value_current))
             continue
 
         value_new = kwargs[key]
@@ -893,7 +1155,7 @@ def prefs(vmname, *varargs, **kwargs):
         # Value matches; no need to update
         if value_current == value_new and (
                 dest != 'pcidevs' or pci_strictreset == current_pci_strictreset):
-            message = fmt.format(dest, value_current)
+            message = _PREFS_FMT.format(dest, value_current)
             qvm.save_status(prefix='[SKIP] ', message=message)
             continue
 
@@ -906,7 +1168,7 @@ def prefs(vmname, *varargs, **kwargs):
                 status.changes[data['key']]['old'] = data['value_old']
                 status.changes[data['key']]['new'] = data['value_new']
             else:
-                message = fmt.format(dest,
+                message = _PREFS_FMT.format(dest,
                     "Setting 'pci_strictreset' works only together with 'pcidevs'")
                 qvm.save_status(retcode=1, message=message)
             # "setting" pci_strictreset handled in 'pcidevs' property
@@ -919,7 +1181,7 @@ def prefs(vmname, *varargs, **kwargs):
             for dev_id in value_new:
                 dev_id_api = dev_id.strip().replace(':', '_')
                 current_assignment = None
-                for a in args.vm.devices['pci'].get_assigned_devices(required_only=True):
+                for a in pci_assigned:
                     if a.port_id == dev_id_api:
                         current_assignment = a
                 if current_assignment and \
@@ -927,7 +1189,8 @@ def prefs(vmname, *varargs, **kwargs):
                         current_assignment.options.get('no-strict-reset', False) != \
                             (not pci_strictreset):
                     # detach and attach again to adjust options
-                    args.vm.devices['pci'].unassign(current_assignment)
+                    vm.devices['pci'].unassign(current_assignment)
+                    pci_assigned.remove(current_assignment)
                     value_combined.remove(dev_id)
 
                 try:
@@ -935,12 +1198,13 @@ def prefs(vmname, *varargs, **kwargs):
                     if pci_strictreset is not None:
                         options['no-strict-reset'] = not pci_strictreset
                     assignment = qubesadmin.device_protocol.DeviceAssignment.new(
-                        args.vm.app.domains['dom0'],
+                        vm.app.domains['dom0'],
                         dev_id_api,
                         devclass='pci',
                         mode="required",
                         options=options)
-                    args.vm.devices['pci'].assign(assignment)
+                    vm.devices['pci'].assign(assignment)
+                    pci_assigned.append(assignment)
                 except qubesadmin.exc.DeviceAlreadyAttached:
                     continue
                 value_combined.append(dev_id)
@@ -952,9 +1216,9 @@ def prefs(vmname, *varargs, **kwargs):
         else:
             log.info("Setting %s to %s", dest, value_new)
             if value_new == '*default*':
-                delattr(args.vm, dest)
+                delattr(vm, dest)
             else:
-                setattr(args.vm, dest, value_new)
+                setattr(vm, dest, value_new)
             status = qvm.save_status(retcode=0)
             status.changes.setdefault(data['key'], {})
             status.changes[data['key']]['old'] = data['value_old']
@@ -1008,6 +1272,9 @@ def devices(vmname, *varargs, **kwargs):
               - pci:dom0:28_00.3: []
               - bridge:sys-net-interfaces:br1: []
     """
+    # pylint: disable=C0415
+    import qubesadmin.device_protocol
+    import qubesadmin.exc
 
     # CLI 'qubesctl qvm.devices <vm_name> (attach|detach) device [device...]'
     if varargs and varargs[0] in ['attach', 'detach']:
@@ -1027,11 +1294,7 @@ def devices(vmname, *varargs, **kwargs):
     kwargs.setdefault('status-mode', 'all')
 
     qvm = _QVMBase('qvm.devices', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument('--list', nargs='*', help='List devices')
     qvm.parser.add_argument(
         '--attach',
@@ -1163,6 +1426,13 @@ def devices(vmname, *varargs, **kwargs):
     return qvm.status()
 
 
+# Feature value set by each service / feature action
+_FEATURE_ACTIONS = {'enable': '1', 'disable': '', 'default': None}
+
+# Display label of a service / feature value
+_FEATURE_LABELS = {'1': 'Enabled', '': 'Disabled', None: 'Missing'}
+
+
 def service(vmname, *varargs, **kwargs):
     """
     Manage a virtual machine domain services::
@@ -1239,11 +1509,7 @@ def service(vmname, *varargs, **kwargs):
     kwargs.setdefault('status-mode', 'all')
 
     qvm = _QVMBase('qvm.service', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument('--list', nargs='*', help='List services')
     qvm.parser.add_argument(
         '--enable',
@@ -1264,34 +1530,15 @@ def service(vmname, *varargs, **kwargs):
         help='List of service names to default'
     )
 
-    # pylint: disable=W0613
-    def run_post(cmd, status, data):
-        """
-        Called by run to allow additional post-processing of status.
-        """
-        if status.passed():
-            status.changes.setdefault(data['key'], {})
-            status.changes[data['key']]['old'] = data['value_old']
-            status.changes[data['key']]['new'] = data['value_new']
-
-    def label(value):
-        """
-        Return a mapped service label.
-        """
-        if value == '1':
-            return 'Enabled'
-        elif value == '':
-            return 'Disabled'
-        elif value is None:
-            return 'Missing'
-        return value
-
-    # action value map
-    action_map = dict(enable='1', disable='', default=None)
-
     args = qvm.parse_args(vmname, *varargs, **kwargs)
-    current_services = dict([(k[len('service.'):], v) for k, v
-                             in args.vm.features.items() if k.startswith('service.')])
+
+    # Snapshot services once; only fetch values of 'service.*' features since
+    # each value read is a separate qubesd call
+    vm_features = args.vm.features
+    current_services = {
+        k[len('service.'):]: vm_features[k]
+        for k in list(vm_features) if k.startswith('service.')
+    }
 
     # Return all current services if a 'list' only was selected
     if args.list is not None or not (
@@ -1306,46 +1553,43 @@ def service(vmname, *varargs, **kwargs):
         return qvm.status()
 
     # Remove duplicate service names; keeping order listed
-    seen = set()
-    for action in [args.default, args.disable, args.enable]:
-        for value in action:
-            if value not in seen:
-                seen.add(value)
-            else:
-                action.remove(value)
+    _remove_duplicates(args.default, args.disable, args.enable)
 
-    changed = False
+    # Split services into those needing an update and those already in the
+    # desired state
+    to_change = []
+    skipped = []
     for action in ['enable', 'disable', 'default']:
-        service_names = getattr(args, action, [])
-        for service_name in service_names:
+        value_new = _FEATURE_ACTIONS[action]
+        for service_name in getattr(args, action, []):
             value_current = current_services.get(service_name, None)
-            value_new = action_map[action]
-
-            # Value matches; no need to update
             if value_current == value_new:
-                message = 'Service already in desired state: {0} \'{1}\' = {2}'.format(
-                    action.upper(), service_name, label(value_current)
-                )
-                qvm.save_status(prefix='[SKIP] ', message=message)
-                continue
+                skipped.append(service_name)
+            else:
+                to_change.append((service_name, value_current, value_new))
 
-            # Execute command (will not execute in test mode)
-            data = dict(
-                key=service_name,
-                value_old=label(value_current),
-                value_new=label(value_new)
+    # Values match; no need to update
+    if skipped:
+        qvm.save_status(
+            prefix='[SKIP] ',
+            message='{0} service(s) already in desired state: {1}'.format(
+                len(skipped), ', '.join(skipped)
             )
+        )
 
-            if not __opts__['test']:
-                if value_new is None:
-                    del args.vm.features['service.' + service_name]
-                else:
-                    args.vm.features['service.' + service_name] = value_new
-                changed = True
-            status = qvm.save_status(retcode=0)
-            status.changes.setdefault(service_name, {})
-            status.changes[service_name]['old'] = label(current_services.get(service_name, None))
-            status.changes[service_name]['new'] = label(value_new)
+    changed = False
+    for service_name, value_current, value_new in to_change:
+        # Execute command (will not execute in test mode)
+        if not __opts__['test']:
+            if value_new is None:
+                del args.vm.features['service.' + service_name]
+            else:
+                args.vm.features['service.' + service_name] = value_new
+            changed = True
+        status = qvm.save_status(retcode=0)
+        status.changes.setdefault(service_name, {})
+        status.changes[service_name]['old'] = _FEATURE_LABELS.get(value_current, value_current)
+        status.changes[service_name]['new'] = _FEATURE_LABELS.get(value_new, value_new)
 
     # Returns the status 'data' dictionary
     return qvm.status()
@@ -1448,11 +1692,7 @@ def features(vmname, *varargs, **kwargs):
     kwargs.setdefault('status-mode', 'all')
 
     qvm = _QVMBase('qvm.features', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument('--list', nargs='*', help='List features')
     qvm.parser.add_argument(
         '--enable',
@@ -1479,31 +1719,6 @@ def features(vmname, *varargs, **kwargs):
         help='List of feature names to set'
     )
 
-    # pylint: disable=W0613
-    def run_post(cmd, status, data):
-        """
-        Called by run to allow additional post-processing of status.
-        """
-        if status.passed():
-            status.changes.setdefault(data['key'], {})
-            status.changes[data['key']]['old'] = data['value_old']
-            status.changes[data['key']]['new'] = data['value_new']
-
-    def label(value):
-        """
-        Return a mapped service label.
-        """
-        if value == '1':
-            return 'Enabled'
-        elif value == '':
-            return 'Disabled'
-        elif value is None:
-            return 'Missing'
-        return value
-
-    # action value map
-    action_map = dict(enable='1', disable='', default=None)
-
     args = qvm.parse_args(vmname, *varargs, **kwargs)
     current_features = dict([(k, v) for k, v in args.vm.features.items()])
 
@@ -1528,13 +1743,7 @@ def features(vmname, *varargs, **kwargs):
         return qvm.status()
 
     # Remove duplicate feature names; keeping order listed
-    seen = set()
-    for action in [args.default, args.disable, args.enable]:
-        for value in action:
-            if value not in seen:
-                seen.add(value)
-            else:
-                action.remove(value)
+    _remove_duplicates(args.default, args.disable, args.enable)
 
     changed = False
     for action in ['enable', 'disable', 'default', 'set']:
@@ -1543,25 +1752,19 @@ def features(vmname, *varargs, **kwargs):
             if action == 'set':
                 (feature_name, value_new), = feature_name.items()
             else:
-                value_new = action_map[action]
+                value_new = _FEATURE_ACTIONS[action]
 
             value_current = current_features.get(feature_name, None)
 
             # Value matches; no need to update
             if value_current == value_new:
                 message = 'Feature already in desired state: {0} \'{1}\' = {2}'.format(
-                    action.upper(), feature_name, label(value_current)
+                    action.upper(), feature_name, _FEATURE_LABELS.get(value_current, value_current)
                 )
                 qvm.save_status(prefix='[SKIP] ', message=message)
                 continue
 
             # Execute command (will not execute in test mode)
-            data = dict(
-                key=feature_name,
-                value_old=label(value_current),
-                value_new=label(value_new)
-            )
-
             if not __opts__['test']:
                 if value_new is None:
                     del args.vm.features[feature_name]
@@ -1637,6 +1840,8 @@ def tags(vmname, *varargs, **kwargs):
               - tag4
 
     """
+    import qubesadmin.exc  # pylint: disable=C0415
+
     # Also allow CLI qubesctl qvm.tags <vm_name> (add|del) tag [tag...]
     if varargs and varargs[0] in ['add', 'del', 'present', 'absent']:
         tags = []
@@ -1646,11 +1851,7 @@ def tags(vmname, *varargs, **kwargs):
             kwargs[varargs[0]] = tags
 
     qvm = _QVMBase('qvm.tags', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument('--list', dest='do_list', nargs='*', help='List tags')
     qvm.parser.add_argument(
         '--add', '--present', dest='do_add',
@@ -1676,13 +1877,7 @@ def tags(vmname, *varargs, **kwargs):
         return qvm.status()
 
     # Remove duplicate tag names; keeping order listed
-    seen = set()
-    for action in [args.do_del, args.do_add]:
-        for value in action:
-            if value not in seen:
-                seen.add(value)
-            else:
-                action.remove(value)
+    _remove_duplicates(args.do_del, args.do_add)
 
     if not __opts__['test']:
         try:
@@ -1762,12 +1957,12 @@ def firewall(vmname, *varargs, **kwargs):
               - action=accept dstports=443 proto=tcp
               - action=drop
     """
+    # pylint: disable=C0415
+    import qubesadmin.exc
+    import qubesadmin.firewall
+
     qvm = _QVMBase('qvm.firewall', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument(
         '--list',
         dest='do_list',
@@ -1808,6 +2003,26 @@ def firewall(vmname, *varargs, **kwargs):
     return qvm.status()
 
 
+# qvm.run store_true flags
+_RUN_FLAGS = (
+    ('quiet', 'Quiet'),
+    ('auto', 'Auto start the VM if not running'),
+    ('tray', 'Use tray notifications instead of stdout'),
+    ('all',
+     'Run command on all currently running VMs (or all paused, in case of --unpause)'),
+    ('pause', "Do 'xl pause' for the VM(s) (can be combined this with --all)"),
+    ('unpause',
+     "Do 'xl unpause' for the VM(s) (can be combined this with --all)"),
+    ('pass-io', 'Pass stdin/stdout/stderr from remote program (implies -q)'),
+    ('nogui', 'Run command without gui'),
+    ('filter-escape-chars',
+     'Filter terminal escape sequences (default if output is terminal)'),
+    ('no-filter-escape-chars',
+     'Do not filter terminal escape sequences - overrides --filter-escape-chars, DANGEROUS when output is terminal'),
+    ('no-color-output', 'Disable marking VM output with red color'),
+)
+
+
 def run(vmname, *varargs, **kwargs):
     """
     Run an application within a virtual machine domain::
@@ -1847,59 +2062,7 @@ def run(vmname, *varargs, **kwargs):
           - no-color-output
     """
     qvm = _QVMBase('qvm.run', **kwargs)
-    qvm.parser.add_argument('--quiet', action='store_true', help='Quiet')
-    qvm.parser.add_argument(
-        '--auto',
-        action='store_true',
-        help='Auto start the VM if not running'
-    )
-    qvm.parser.add_argument(
-        '--tray',
-        action='store_true',
-        help='Use tray notifications instead of stdout'
-    )
-    qvm.parser.add_argument(
-        '--all',
-        action='store_true',
-        help=
-        'Run command on all currently running VMs (or all paused, in case of --unpause)'
-    )
-    qvm.parser.add_argument(
-        '--pause',
-        action='store_true',
-        help="Do 'xl pause' for the VM(s) (can be combined this with --all)"
-    )
-    qvm.parser.add_argument(
-        '--unpause',
-        action='store_true',
-        help="Do 'xl unpause' for the VM(s) (can be combined this with --all)"
-    )
-    qvm.parser.add_argument(
-        '--pass-io',
-        action='store_true',
-        help='Pass stdin/stdout/stderr from remote program (implies -q)'
-    )
-    qvm.parser.add_argument(
-        '--nogui',
-        action='store_true',
-        help='Run command without gui'
-    )
-    qvm.parser.add_argument(
-        '--filter-escape-chars',
-        action='store_true',
-        help='Filter terminal escape sequences (default if output is terminal)'
-    )
-    qvm.parser.add_argument(
-        '--no-filter-escape-chars',
-        action='store_true',
-        help=
-        'Do not filter terminal escape sequences - overrides --filter-escape-chars, DANGEROUS when output is terminal'
-    )
-    qvm.parser.add_argument(
-        '--no-color-output',
-        action='store_true',
-        help='Disable marking VM output with red color'
-    )
+    _add_store_true_flags(qvm.parser, _RUN_FLAGS)
     qvm.parser.add_argument(
         '--user',
         nargs=1,
@@ -1921,11 +2084,7 @@ def run(vmname, *varargs, **kwargs):
         nargs='*',
         help='When --all is used: exclude this VM name (may be repeated)'
     )
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     qvm.parser.add_argument(
         'cmd',
         nargs='*',
@@ -1946,13 +2105,55 @@ def run(vmname, *varargs, **kwargs):
             return qvm.status()
 
     # Execute command (will not execute in test mode)
-    cmd = '/usr/bin/qvm-run {0}'.format(' '.join(args._argv))  # pylint: disable=W0212
+    cmd = shlex.join(['/usr/bin/qvm-run'] + args._argv)  # pylint: disable=W0212
     status = qvm.run(cmd)  # pylint: disable=W0612
 
     # Returns the status 'data' dictionary
     return qvm.status()
 
 
+def _start_guid(vm):  # pylint: disable=C0103
+    """
+    Prevent startup status showing as `Transient`.
+    """
+    try:
+        if not vm.is_guid_running():
+            vm.start_guid()
+    except AttributeError:
+        # AttributeError: CEncodingAwareStringIO instance has no attribute 'fileno'
+        pass
+
+
+def _start_is_transient(qvm):
+    """
+    Start guid if VM is `transient`.
+    """
+    args = qvm.args
+    transient_status = _power_status(args.vm, ['transient'], qvm.power_states)
+    if transient_status.passed():
+        if __opts__['test']:
+            message = '\'guid\' will be started since in \'transient\' state!'
+            qvm.save_status(transient_status, message=message)
+            return qvm.status()
+
+        # 'start_guid' then confirm 'running' power state
+        _start_guid(args.vm)
+        qvm.power_states.invalidate(args.vmname)
+        return not is_running(
+            qvm,
+            error_message='\'guid\' failed to start!'
+        )
+    return False
+
+
+# qvm.start store_true flags
+_START_FLAGS = (
+    ('quiet', 'Quiet'),
+    ('install-windows-tools', 'Attach Windows tools CDROM to the VM'),
+    ('debug', 'Enable debug mode for this VM (until its shutdown)'),
+)
+
+
 def start(vmname, *varargs, **kwargs):
     """
     Start a virtual machine domain::
@@ -1983,17 +2184,7 @@ def start(vmname, *varargs, **kwargs):
           - install-windows-tools
     """
     qvm = _QVMBase('qvm.start', **kwargs)
-    qvm.parser.add_argument('--quiet', action='store_true', help='Quiet')
-    qvm.parser.add_argument(
-        '--install-windows-tools',
-        action='store_true',
-        help='Attach Windows tools CDROM to the VM'
-    )
-    qvm.parser.add_argument(
-        '--debug',
-        action='store_true',
-        help='Enable debug mode for this VM (until its shutdown)'
-    )
+    _add_store_true_flags(qvm.parser, _START_FLAGS)
     qvm.parser.add_argument(
         '--drive',
         help="Temporarily attach specified drive as CD/DVD or hard disk "
@@ -2011,51 +2202,17 @@ def start(vmname, *varargs, **kwargs):
         '--custom-config',
         help='Use custom Xen config instead of Qubes-generated one'
     )
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     args = qvm.parse_args(vmname, *varargs, **kwargs)
 
-    def start_guid():
-        """
-        Prevent startup status showing as `Transient`.
-        """
-        try:
-            if not args.vm.is_guid_running():
-                args.vm.start_guid()
-        except AttributeError:
-            # AttributeError: CEncodingAwareStringIO instance has no attribute 'fileno'
-            pass
-
-    def is_transient():
-        """
-        Start guid if VM is `transient`.
-        """
-        transient_status = state(args.vmname, *['transient'])
-        if transient_status.passed():
-            if __opts__['test']:
-                message = '\'guid\' will be started since in \'transient\' state!'
-                qvm.save_status(transient_status, message=message)
-                return qvm.status()
-
-            # 'start_guid' then confirm 'running' power state
-            start_guid()
-            return not is_running(
-                qvm,
-                error_message='\'guid\' failed to start!'
-            )
-        return False
-
     # No need to start if VM is already 'running'
     if is_running(qvm):
         return qvm.status()
 
     # 'unpause' VM if its 'paused'
-    paused_status = state(args.vmname, *['paused'])
-    if paused_status.passed():
+    if _power_state(args.vm, qvm.power_states) == 'paused':
         resume_status = unpause(args.vmname)
+        qvm.power_states.invalidate(args.vmname)
         qvm.save_status(
             resume_status,
             error_message='VM failed to resume from pause!'
@@ -2063,16 +2220,22 @@ def start(vmname, *varargs, **kwargs):
         if not resume_status:
             return qvm.status()
 
-    if is_transient():
+    if _start_is_transient(qvm):
         return qvm.status()
 
-    # Execute command (will not execute in test mode)
-    cmd = '/usr/bin/qvm-start {0}'.format(' '.join(args._argv))  # pylint: disable=W0212
-    status = qvm.run(cmd)  # pylint: disable=W0612
+    # Execute command (will not execute in test mode); options only
+    # qvm-start knows how to apply still go through the command line
+    cmd = shlex.join(['/usr/bin/qvm-start'] + args._argv)  # pylint: disable=W0212
+    if args.drive or args.hddisk or args.cdrom or args.custom_config or \
+            args.install_windows_tools or args.debug:
+        status = qvm.run(cmd)  # pylint: disable=W0612
+        qvm.power_states.invalidate(args.vmname)
+    else:
+        status = _vm_call(qvm, cmd, args.vm.start)  # pylint: disable=W0612
 
     # Confirm VM has been started (don't fail in test mode)
     if not __opts__['test']:
-        if is_transient():
+        if _start_is_transient(qvm):
             return qvm.status()
 
         is_running(qvm)
@@ -2081,6 +2244,59 @@ def start(vmname, *varargs, **kwargs):
     return qvm.status()
 
 
+# qvm.shutdown flags allowing a 'transient' VM to be killed
+_SHUTDOWN_FORCE_FLAGS = ('force', 'kill')
+
+
+def _shutdown_is_transient(qvm):
+    """
+    Kill if transient and `force` option enabled.
+    """
+    args = qvm.args
+    transient_status = _power_status(args.vm, ['transient'], qvm.power_states)
+    if transient_status.passed():
+        if __opts__['test']:
+            force = [flag for flag in _SHUTDOWN_FORCE_FLAGS if getattr(args, flag)]
+            if force:
+                message = 'VM will be killed in \'transient\' state since {0} enabled!'.format(
+                    ' + '.join(force)
+                )
+            else:
+                message = 'VM is \'transient\'. \'kill\' or \'force\' mode not enabled!'
+                transient_status.retcode = 1
+            qvm.save_status(transient_status, message=message)
+            return qvm.status()
+
+        # 'kill' then confirm 'halted' power state
+        cmd = shlex.join(['/usr/bin/qvm-kill', args.vmname])
+        status = _vm_call(qvm, cmd, args.vm.kill)  # pylint: disable=W0612
+        return not is_halted(
+            qvm,
+            message='\'guid\' failed to halt!'
+        ).passed()
+    return False
+
+
+def _shutdown_vm(vm, force=False, wait=False):  # pylint: disable=C0103
+    """
+    Shutdown `vm`; waiting for it to halt if `wait` is enabled.
+    """
+    vm.shutdown(force=force)
+    if wait:
+        _wait_for_shutdown(vm)
+
+
+# qvm.shutdown store_true flags
+_SHUTDOWN_FLAGS = (
+    ('quiet', 'Quiet'),
+    ('kill', 'Kill VM'),
+    ('force',
+     'Force operation, even if may damage other VMs (eg shutdown of NetVM)'),
+    ('wait', 'Wait for the VM(s) to shutdown'),
+    ('all', 'Shutdown all running VMs'),
+)
+
+
 def shutdown(vmname, *varargs, **kwargs):
     """
     Shutdown a virtual machine domain::
@@ -2109,34 +2325,7 @@ def shutdown(vmname, *varargs, **kwargs):
           - kill
     """
     qvm = _QVMBase('qvm.shutdown', **kwargs)
-    qvm.parser.add_argument(
-        '--quiet',
-        action='store_true',
-        default=False,
-        help='Quiet'
-    )
-    qvm.parser.add_argument(
-        '--kill',
-        action='store_true',
-        default=False,
-        help='Kill VM'
-    )
-    qvm.parser.add_argument(
-        '--force',
-        action='store_true',
-        help=
-        'Force operation, even if may damage other VMs (eg shutdown of NetVM)'
-    )
-    qvm.parser.add_argument(
-        '--wait',
-        action='store_true',
-        help='Wait for the VM(s) to shutdown'
-    )
-    qvm.parser.add_argument(
-        '--all',
-        action='store_true',
-        help='Shutdown all running VMs'
-    )
+    _add_store_true_flags(qvm.parser, _SHUTDOWN_FLAGS)
     qvm.parser.add_argument(
         '--exclude',
         action='store',
@@ -2144,42 +2333,9 @@ def shutdown(vmname, *varargs, **kwargs):
         nargs='*',
         help='When --all is used: exclude this VM name (may be repeated)'
     )
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     args = qvm.parse_args(vmname, *varargs, **kwargs)
 
-    def is_transient():
-        """
-        Kill if transient and `force` option enabled.
-        """
-        transient_status = state(args.vmname, *['transient'])
-        if transient_status.passed():
-            if __opts__['test']:
-                force = set(['force', 'kill']).intersection(kwargs)
-                if force:
-                    message = 'VM will be killed in \'transient\' state since {0} enabled!'.format(
-                        ' + '.join(force)
-                    )
-                else:
-                    message = 'VM is \'transient\'. \'kill\' or \'force\' mode not enabled!'
-                    transient_status.retcode = 1
-                qvm.save_status(transient_status, message=message)
-                return qvm.status()
-
-            # 'kill' then confirm 'halted' power state
-            cmd = '/usr/bin/qvm-kill {0}'.format(args.vmname)
-            status = qvm.run(cmd)  # pylint: disable=W0612
-            return not qvm.save_status(
-                is_halted(
-                    qvm,
-                    message='\'guid\' failed to halt!'
-                )
-            )
-        return False
-
     if __opts__['test']:
         if args.kill:
             message = 'VM is set to be killed'
@@ -2188,39 +2344,43 @@ def shutdown(vmname, *varargs, **kwargs):
         qvm.save_status(message=message)
         return qvm.status()
 
+    # Shut down '--all' VMs with a single qvm-shutdown invocation; its
+    # '--wait' and '--exclude' options cover every VM so there is no need to
+    # probe the named VM
+    if args.all and not args.kill:
+        cmd = shlex.join(['/usr/bin/qvm-shutdown'] + args._argv)  # pylint: disable=W0212
+        status = qvm.run(cmd)  # pylint: disable=W0612
+        return qvm.status()
+
     # No need to start if VM is already 'halted'
     if is_halted(qvm):
         return qvm.status()
 
     # 'unpause' VM then if its 'paused', then confirm 'halted' power state
-    paused_status = state(args.vmname, *['paused'])
-    if paused_status.passed():
+    if _power_state(args.vm, qvm.power_states) == 'paused':
         args.vm.unpause()
-        # pylint: disable=W0612
-        halted = qvm.save_status(
-            is_halted(
-                qvm,
-                message='VM failed to resume from pause!'
-            )
-        )
+        qvm.power_states.invalidate(args.vmname)
+        is_halted(qvm, message='VM failed to resume from pause!')
         return qvm.status()
 
-    if is_transient():
+    if _shutdown_is_transient(qvm):
         return qvm.status()
 
     # Execute command (will not execute in test mode)
     if qvm.args.kill:
-        cmd = '/usr/bin/qvm-kill {0}'.format(args.vmname)
+        cmd = shlex.join(['/usr/bin/qvm-kill', args.vmname])
+        status = _vm_call(qvm, cmd, args.vm.kill)  # pylint: disable=W0612
     else:
-        cmd = '/usr/bin/qvm-shutdown {0}'.format(' '.join(args._argv))  # pylint: disable=W0212
-    status = qvm.run(cmd)  # pylint: disable=W0612
+        cmd = shlex.join(['/usr/bin/qvm-shutdown'] + args._argv)  # pylint: disable=W0212
+        status = _vm_call(  # pylint: disable=W0612
+            qvm, cmd, _shutdown_vm, args.vm, force=args.force, wait=args.wait
+        )
 
-    # Kill if still not 'halted' only if 'force' enabled
+    # Kill if still not 'halted' only if 'force' enabled, then confirm
     if not is_halted(qvm) and args.force:
-        cmd = '/usr/bin/qvm-kill {0}'.format(args.vmname)
-        status = qvm.run(cmd)
-
-    is_halted(qvm)
+        cmd = shlex.join(['/usr/bin/qvm-kill', args.vmname])
+        status = _vm_call(qvm, cmd, args.vm.kill)
+        is_halted(qvm)
 
     # Returns the status 'data' dictionary
     return qvm.status()
@@ -2243,23 +2403,10 @@ def kill(vmname, *varargs, **kwargs):
         # Required Positional
         - name:                 <vmname>
     """
-    qvm = _QVMBase('qvm.kill', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
-    args = qvm.parse_args(vmname, *varargs, **kwargs)
-
-    kwargs.setdefault('flags', [])
-    kwargs['flags'].append('kill')
-
-    # 'kill' VM
-    halted_status = shutdown(args.vmname, *varargs, **kwargs)
-
-    # Returns the status 'data' dictionary
-    qvm.save_status(halted_status)
-    return qvm.status()
+    # 'kill' VM; qvm.shutdown parses the arguments and returns the status
+    # 'data' dictionary
+    kwargs['flags'] = list(kwargs.get('flags', [])) + ['kill']
+    return shutdown(vmname, *varargs, **kwargs)
 
 
 def pause(vmname, *varargs, **kwargs):
@@ -2280,11 +2427,7 @@ def pause(vmname, *varargs, **kwargs):
         - name:                 <vmname>
     """
     qvm = _QVMBase('qvm.pause', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     args = qvm.parse_args(vmname, *varargs, **kwargs)
 
     # Can't pause VM if it's not running
@@ -2300,8 +2443,9 @@ def pause(vmname, *varargs, **kwargs):
 
     # Execute command (will not execute in test mode)
     args.vm.pause()
+    qvm.power_states.invalidate(args.vmname)
 
-    paused_status = state(args.vmname, *['paused'])
+    paused_status = _power_status(args.vm, ['paused'], qvm.power_states)
     qvm.save_status(paused_status, retcode=paused_status.retcode)
 
     # Returns the status 'data' dictionary
@@ -2326,11 +2470,7 @@ def unpause(vmname, *varargs, **kwargs):
         - name:                 <vmname>
     """
     qvm = _QVMBase('qvm.unpause', **kwargs)
-    qvm.parser.add_argument(
-        'vmname',
-        action=_VMAction,
-        help='Virtual machine name'
-    )
+    _add_vmname_argument(qvm.parser)
     args = qvm.parse_args(vmname, *varargs, **kwargs)
 
     # Can't resume VM if it's not paused
@@ -2346,8 +2486,9 @@ def unpause(vmname, *varargs, **kwargs):
 
     # Execute command (will not execute in test mode)
     args.vm.unpause()
+    qvm.power_states.invalidate(args.vmname)
 
-    running_status = state(args.vmname, *['running'])
+    running_status = _power_status(args.vm, ['running'], qvm.power_states)
     qvm.save_status(
         running_status,
         retcode=running_status.retcode,
@@ -2366,7 +2507,7 @@ def template_info(name, **kwargs):
     or empty dict if not found
     """
     info_ret = __salt__['cmd.run_all'](
-            'qvm-template info --installed --machine-readable-json {}'.format(name),
+            ['qvm-template', 'info', '--installed', '--machine-readable-json', name],
             ignore_retcode=True)
     if info_ret['retcode']:
         # not found
@@ -2396,14 +2537,15 @@ def template_install(name, version=None, fromrepo=None, pool=None, **kwargs):
         install into specific storage pool
     """
 
-    cmd = 'qvm-template install --quiet'
+    cmd = ['qvm-template', 'install', '--quiet']
     if fromrepo:
-        cmd += ' --repoid={}'.format(fromrepo)
+        cmd.append('--repoid={}'.format(fromrepo))
     if pool:
-        cmd += ' --pool={}'.format(pool)
-    cmd += ' ' + name
+        cmd.append('--pool={}'.format(pool))
     if version:
-        cmd += '-' + version
+        cmd.append(name + '-' + version)
+    else:
+        cmd.append(name)
 
     ret = __salt__['cmd.run_all'](cmd)
     if ret['retcode']:
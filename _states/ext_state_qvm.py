@@ -74,8 +74,6 @@ import logging
 
 # Import salt libs
 from salt.exceptions import (CommandExecutionError, SaltInvocationError)
-from salt.output import nested
-from salt.utils.odict import OrderedDict as _OrderedDict
 
 # Import custom libs
 import qubes_utils  # pylint: disable=F0401
@@ -105,6 +103,9 @@ def __virtual__():
     if not hasattr(qubes_utils, '__salt__'):
         qubes_utils.__salt__ = __salt__
 
+    # Module functions may have been reloaded
+    _FN_CACHE.clear()
+
     if 'qvm.prefs' in __salt__:
         return __virtualname__
     return False
@@ -114,10 +115,28 @@ def _nested_output(obj):
     '''
     Serialize obj and format for output.
     '''
+    from salt.output import nested  # pylint: disable=C0415
     nested.__opts__ = __opts__
     return nested.output(obj).rstrip()
 
 
+# Resolved __salt__ module functions keyed by name
+_FN_CACHE = {}
+
+
+def _call_action(_action, *varargs, **kwargs):
+    '''
+    Call Qubes module and return its status.
+    '''
+    function = _FN_CACHE.get(_action)
+    if function is None:
+        function = _FN_CACHE[_action] = __salt__[_action]
+    try:
+        return function(*varargs, **kwargs)
+    except (SaltInvocationError, CommandExecutionError) as err:
+        return Status(retcode=1, result=False, stderr=err.message + '\n')
+
+
 def _state_action(_action, *varargs, **kwargs):
     '''
     State utility to standardize calling Qubes modules.
@@ -129,15 +148,18 @@ def _state_action(_action, *varargs, **kwargs):
         from qubes_state_utils import state_action as _state_action
 
         def exists(name, *varargs, **kwargs):
-            varargs = list(varargs)
-            varargs.append('exists')
-            return _state_action('qvm.check', name, *varargs, **kwargs)
+            return _state_action('qvm.check', name, *varargs, 'exists',
+                                 **kwargs)
     '''
-    try:
-        status = __salt__[_action](*varargs, **kwargs)
-    except (SaltInvocationError, CommandExecutionError) as err:
-        status = Status(retcode=1, result=False, stderr=err.message + '\n')
-    return vars(status)
+    return vars(_call_action(_action, *varargs, **kwargs))
+
+
+def _skip(message):
+    '''
+    Return a finalized '[SKIP] ' status with `message`.
+    '''
+    status = Status()._format(prefix='[SKIP] ', message=message)
+    return vars(status._finalize(test_mode=__opts__['test']))
 
 
 def exists(name, *varargs, **kwargs):
@@ -147,9 +169,7 @@ def exists(name, *varargs, **kwargs):
     Return True only if the named VM exists.  Will not create the VM if
     missing (qvm-exists).
     '''
-    varargs = list(varargs)
-    varargs.append('exists')
-    return _state_action('qvm.check', name, *varargs, **kwargs)
+    return _state_action('qvm.check', name, *varargs, 'exists', **kwargs)
 
 
 def missing(name, *varargs, **kwargs):
@@ -159,52 +179,56 @@ def missing(name, *varargs, **kwargs):
     Return True only if the named VM is missing.  Will not remove the VM if
     present (qvm-missing).
     '''
-    varargs = list(varargs)
-    varargs.append('missing')
-    return _state_action('qvm.check', name, *varargs, **kwargs)
+    return _state_action('qvm.check', name, *varargs, 'missing', **kwargs)
 
 
 def running(name, *varargs, **kwargs):
     '''
     Return True is vmname is running (qvm-running).
     '''
-    varargs = list(varargs)
-    varargs.append('running')
-    return _state_action('qvm.state', name, *varargs, **kwargs)
+    return _state_action('qvm.state', name, *varargs, 'running', **kwargs)
 
 
 def halted(name, *varargs, **kwargs):
     '''
     Return True is vmname is halted (qvm-halted).
     '''
-    varargs = list(varargs)
-    varargs.append('halted')
     # Return if VM already halted (stderr will contain message if VM absent)
-    halted_status = Status(**_state_action('qvm.state', name, *varargs,
-                                           **kwargs))
+    halted_status = _call_action('qvm.state', name, *varargs, 'halted',
+                                 **kwargs)
     if halted_status.passed() or halted_status.stderr:
         message = halted_status.stderr or "'{0}' is already halted.".format(
             name)
-        status = Status()._format(prefix='[SKIP] ', message=message)
-        return vars(status._finalize(test_mode=__opts__['test']))
-    return _state_action('qvm.state', name, *varargs, **kwargs)
+        return _skip(message)
+    # Not halted; report the status already read
+    return vars(halted_status)
+
+
+# Flags always passed to qvm.start
+_START_PASSTHROUGH_FLAGS = ('quiet',)
 
 
 def start(name, *varargs, **kwargs):
     '''
     Start vmname (qvm-start).
     '''
-    kwargs.setdefault('flags', [])
-    kwargs['flags'].extend(['quiet'])
+    # Copy; the caller's flags list is left untouched
+    kwargs['flags'] = (list(kwargs.get('flags', ())) +
+                       list(_START_PASSTHROUGH_FLAGS))
     return _state_action('qvm.start', name, *varargs, **kwargs)
 
 
+# Flags always passed to qvm.shutdown
+_SHUTDOWN_PASSTHROUGH_FLAGS = ('wait',)
+
+
 def shutdown(name, *varargs, **kwargs):
     '''
     Shutdown vmname (qvm-shutdown).
     '''
-    kwargs.setdefault('flags', [])
-    kwargs['flags'].append('wait')
+    # Copy; the caller's flags list is left untouched
+    kwargs['flags'] = (list(kwargs.get('flags', ())) +
+                       list(_SHUTDOWN_PASSTHROUGH_FLAGS))
     return _state_action('qvm.shutdown', name, *varargs, **kwargs)
 
 
@@ -213,12 +237,11 @@ def kill(name, *varargs, **kwargs):
     Kill vmname (qvm-kill).
     '''
     # Return if VM already halted (stderr will contain message if VM absent)
-    halted_status = Status(**_state_action('qvm.state', name, *['halted']))
+    halted_status = _call_action('qvm.state', name, 'halted')
     if halted_status.passed():
         message = halted_status.stderr or "'{0}' is already halted.".format(
             name)
-        status = Status()._format(prefix='[SKIP] ', message=message)
-        return vars(status._finalize(test_mode=__opts__['test']))
+        return _skip(message)
     return _state_action('qvm.kill', name, *varargs, **kwargs)
 
 
@@ -243,11 +266,10 @@ def present(name, *varargs, **kwargs):
     VM will be created if missing (qvm-present).
     '''
     # Return if VM already exists
-    exists_status = Status(**_state_action('qvm.check', name, *['exists']))
+    exists_status = _call_action('qvm.check', name, 'exists')
     if exists_status.passed():
         message = "A VM with the name '{0}' already exists.".format(name)
-        status = Status()._format(prefix='[SKIP] ', message=message)
-        return vars(status._finalize(test_mode=__opts__['test']))
+        return _skip(message)
     return _state_action('qvm.create', name, *varargs, **kwargs)
 
 
@@ -258,11 +280,10 @@ def absent(name, *varargs, **kwargs):
     VM will be deleted (removed) if present (qvm-absent).
     '''
     # Return if VM already absent
-    missing_status = Status(**_state_action('qvm.check', name, *['missing']))
+    missing_status = _call_action('qvm.check', name, 'missing')
     if missing_status.passed():
         message = "The VM with the name '{0}' is already missing.".format(name)
-        status = Status()._format(prefix='[SKIP] ', message=message)
-        return vars(status._finalize(test_mode=__opts__['test']))
+        return _skip(message)
     return _state_action('qvm.remove', name, *varargs, **kwargs)
 
 
@@ -271,11 +292,10 @@ def clone(name, source, *varargs, **kwargs):
     Clone a VM (qvm-clone).
     '''
     # Return if VM already exists
-    exists_status = Status(**_state_action('qvm.check', name, *['exists']))
+    exists_status = _call_action('qvm.check', name, 'exists')
     if exists_status.passed():
         message = "A VM with the name '{0}' already exists.".format(name)
-        status = Status()._format(prefix='[SKIP] ', message=message)
-        return vars(status._finalize(test_mode=__opts__['test']))
+        return _skip(message)
     return _state_action('qvm.clone', source, name, *varargs, **kwargs)
 
 
@@ -328,6 +348,33 @@ def firewall(name, *varargs, **kwargs):
     return _state_action('qvm.firewall', name, *varargs, **kwargs)
 
 
+# vm() actions in default execution order
+_ACTIONS = (
+    'exists',
+    'running',
+    'missing',
+    'halted',
+    'absent',
+    'present',
+    'clone',
+    'prefs',
+    'devices',
+    'service',
+    'features',
+    'firewall',
+    'tags',
+    'unpause',
+    'pause',
+    'shutdown',
+    'kill',
+    'start',
+    'run',
+)
+
+# vm() action name to state function
+_ACTION_DISPATCH = {action: globals()[action] for action in _ACTIONS}
+
+
 # pylint: disable=W0613,C0103
 def vm(name, *varargs, **kwargs):
     '''
@@ -364,48 +411,29 @@ def vm(name, *varargs, **kwargs):
         Separate the action from action value.
         '''
         action_value = 'fail'
-        if isinstance(action, collections.abc.Mapping):
-            action, action_value = list(action.items())[0]
+        # YAML mappings are plain dicts; skip the ABC check for them
+        if type(action) is dict or \
+                isinstance(action, collections.abc.Mapping):
+            action, action_value = next(iter(action.items()))
         return action, action_value
 
-    actions = [
-        'exists',
-        'running',
-        'missing',
-        'halted',
-        'absent',
-        'present',
-        'clone',
-        'prefs',
-        'devices',
-        'service',
-        'features',
-        'firewall',
-        'tags',
-        'unpause',
-        'pause',
-        'shutdown',
-        'kill',
-        'start',
-        'run',
-    ]
-
     ret = {'name': name, 'changes': {}, 'result': True, 'comment': ''}
 
-    if __opts__['test']:
+    test_mode = __opts__['test']
+    if test_mode:
         ret['result'] = None
 
     # Action ordering from state file
-    actions = kwargs.pop('actions', actions)
+    actions = kwargs.pop('actions', _ACTIONS)
+
+    # Separate each action from its value once
+    actions = [get_action(action) for action in actions]
 
     # Store only the actions; no values
-    _actions = []
-    for action in actions:
-        action, action_value = get_action(action)
-        _actions.append(action)
+    _actions = {action for action, _ in actions}
 
     for action in kwargs:
-        if action not in _actions:
+        if action not in _actions or action not in _ACTION_DISPATCH:
             ret['result'] = False
             ret['comment'] = 'Unknown action keyword: {0}'.format(action)
             return ret
@@ -415,49 +443,51 @@ def vm(name, *varargs, **kwargs):
         Parse dictionary to create varargs + keyword args.
         '''
         varargs = []
-        keywords = _OrderedDict()
+        keywords = {}
         for option in options:
-            if isinstance(option, collections.abc.Mapping):
+            if type(option) is dict or \
+                    isinstance(option, collections.abc.Mapping):
                 keywords.update(option)
             else:
                 varargs.append(option)
         return varargs, keywords
 
-    for action in actions:
-        action, action_value = get_action(action)
+    # Comment section of each executed or skipped action
+    comments = []
+
+    for action, action_value in actions:
+        if action not in kwargs:
+            continue
 
-        if action in kwargs:
+        # Execute action
+        if ret['result'] or test_mode:
             # Parse kwargs and create varargs + keywords
             _varargs, keywords = parse_options(kwargs[action])
-
-            # Execute action
-            if ret['result'] or __opts__['test']:
-                status = globals()[action](name, *_varargs, **keywords)
-            else:
-                linefeed = '\n\n' if ret['comment'] else ''
-                ret['comment'] += '{0}====== [\'{1}\'] ======\n'.format(
-                    linefeed, action)
-                ret['comment'] += '[SKIP] Skipping due to previous failure!'
-                continue
-
-            # Don't fail if action_value set to pass
-            if not status['result'] and 'pass' not in action_value.lower():
-                ret['result'] = status['result']
-
-            if 'changes' in status and status['changes']:
-                ret['changes']['qvm.' + action] = status['changes']
-
-            linefeed = '\n\n' if ret['comment'] else ''
-            ret['comment'] += '{0}====== [\'{1}\'] ======\n'.format(linefeed,
-                                                                    action)
-
-            if 'comment' in status and status['comment'].strip():
-                ret['comment'] += status['comment']
-            elif 'stdout' in status and status['stdout'].strip():
-                ret['comment'] += status['stdout'].strip()
-            elif 'stderr' in status and status['stderr'].strip():
-                ret['comment'] += status['stderr'].strip()
-
+            status = _ACTION_DISPATCH[action](name, *_varargs, **keywords)
+        else:
+            comments.append(
+                '====== [\'{0}\'] ======\n'.format(action) +
+                '[SKIP] Skipping due to previous failure!'
+            )
+            continue
+
+        # Don't fail if action_value set to pass
+        if not status['result'] and 'pass' not in action_value.lower():
+            ret['result'] = status['result']
+
+        if 'changes' in status and status['changes']:
+            ret['changes']['qvm.' + action] = status['changes']
+
+        comment = '====== [\'{0}\'] ======\n'.format(action)
+        if 'comment' in status and status['comment'].strip():
+            comment += status['comment']
+        elif 'stdout' in status and status['stdout'].strip():
+            comment += status['stdout'].strip()
+        elif 'stderr' in status and status['stderr'].strip():
+            comment += status['stderr'].strip()
+        comments.append(comment)
+
+    ret['comment'] = '\n\n'.join(comments)
     return ret
 
 